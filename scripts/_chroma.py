@@ -0,0 +1,40 @@
+"""
+Shared ChromaDB Client
+One process-wide PersistentClient (telemetry disabled) plus a cached
+handle to the pdf_chunks collection, reused across the scripts so each
+doesn't spin up its own client state and background telemetry threads.
+"""
+
+from pathlib import Path
+
+# Paths
+PROJECT_ROOT = Path(__file__).parent.parent
+CHROMA_DIR = PROJECT_ROOT / "data" / "chroma_db"
+
+COLLECTION_NAME = "pdf_chunks"
+
+_client = None
+_collection = None
+
+
+def get_client():
+    """Return the shared PersistentClient, creating it on first use."""
+    global _client
+    if _client is None:
+        # Imported lazily so merely importing this module stays cheap
+        import chromadb
+        from chromadb.config import Settings
+
+        _client = chromadb.PersistentClient(
+            path=str(CHROMA_DIR),
+            settings=Settings(anonymized_telemetry=False, allow_reset=False),
+        )
+    return _client
+
+
+def get_collection():
+    """Return the cached pdf_chunks collection (raises if not ingested)."""
+    global _collection
+    if _collection is None:
+        _collection = get_client().get_collection(COLLECTION_NAME)
+    return _collection
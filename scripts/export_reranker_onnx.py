@@ -0,0 +1,72 @@
+"""
+Reranker ONNX Export
+Exports the cross-encoder reranker to ONNX and quantizes it to dynamic INT8.
+
+The query pipeline picks up the quantized model automatically (see
+RERANKER_ONNX_PATH in query.py) and falls back to the PyTorch
+CrossEncoder when it is absent. Requires the optional export deps:
+
+    pip install "optimum[onnxruntime]"
+"""
+
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+
+from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Paths
+PROJECT_ROOT = Path(__file__).parent.parent
+MODELS_DIR = PROJECT_ROOT / "models"
+
+RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+ONNX_FILENAME = "reranker-int8.onnx"
+
+
+def export_reranker():
+    """Export the reranker to ONNX and dynamically quantize to INT8."""
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = Path(tmp_dir)
+
+        logger.info(f"Exporting {RERANKER_MODEL} to ONNX...")
+        model = ORTModelForSequenceClassification.from_pretrained(
+            RERANKER_MODEL, export=True
+        )
+        model.save_pretrained(tmp_path)
+
+        # Dynamic INT8 quantization - weights stored as int8, activations
+        # quantized at runtime; runs on the VNNI int8 GEMM path where the
+        # CPU supports it
+        logger.info("Quantizing to dynamic INT8...")
+        quantizer = ORTQuantizer.from_pretrained(model)
+        quantization_config = AutoQuantizationConfig.avx512_vnni(is_static=False)
+        quantizer.quantize(
+            save_dir=tmp_path,
+            quantization_config=quantization_config,
+        )
+
+        quantized = tmp_path / "model_quantized.onnx"
+        shutil.copy(quantized, MODELS_DIR / ONNX_FILENAME)
+
+    # The tokenizer files live alongside the model so query.py can load
+    # them without a network round-trip
+    tokenizer = AutoTokenizer.from_pretrained(RERANKER_MODEL)
+    tokenizer.save_pretrained(MODELS_DIR / "reranker-tokenizer")
+
+    logger.info(f"✓ Quantized reranker written to {MODELS_DIR / ONNX_FILENAME}")
+
+
+if __name__ == "__main__":
+    export_reranker()
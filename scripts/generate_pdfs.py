@@ -4,12 +4,16 @@ Generates 100 sample PDFs across diverse categories for testing the PDF search s
 Categories: Financial Reports, Technical Docs, HR Policies, Legal Contracts, Research Papers
 """
 
+import functools
+import multiprocessing
 import os
+import string
 from pathlib import Path
+import re
+import textwrap
 from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from tqdm import tqdm
 import random
 
 # Output directory
@@ -239,122 +243,158 @@ CATEGORIES = {
     },
 }
 
+# Parse each template into a (literal, field) token list once at import
+# time, so filling is a dict lookup per field instead of re-parsing the
+# multi-kilobyte template string on every PDF.
+def _parse_template(template: str) -> list[tuple[str, str | None, str]]:
+    """Pre-parse a format string into (literal, field_name, format_spec) tokens."""
+    return [
+        (literal, field, spec or "")
+        for literal, field, spec, _ in string.Formatter().parse(template)
+    ]
+
+
+def _render_parsed(parsed: list[tuple[str, str | None, str]], values: dict) -> str:
+    """Fill a pre-parsed template from a values dict."""
+    parts = []
+    for literal, field, spec in parsed:
+        parts.append(literal)
+        if field is not None:
+            parts.append(format(values[field], spec))
+    return "".join(parts)
+
+
+for _category in CATEGORIES:
+    CATEGORIES[_category]["_parsed"] = [
+        _parse_template(t) for t in CATEGORIES[_category]["content_templates"]
+    ]
+    CATEGORIES[_category]["_parsed_filenames"] = [
+        _parse_template(t) for t in CATEGORIES[_category]["filenames"]
+    ]
+
+
+# Single module-level RNG instance - per-call random.* goes through the
+# module facade's global lock-free singleton anyway, but a dedicated
+# Random lets callers seed generation deterministically.
+_RNG = random.Random()
+
+# Choice pools, hoisted so fillers don't rebuild the lists (and the
+# filtered variants) on every template fill
+_MONTHS = ["January", "February", "March", "April", "May", "June",
+           "July", "August", "September", "October", "November", "December"]
+_SEGMENTS = ["Enterprise", "SMB", "Consumer", "Government", "Healthcare"]
+_REGIONS = ["North America", "EMEA", "APAC", "Latin America"]
+_SYSTEMS = ["OrderManagement", "CustomerPortal", "Analytics", "DataPipeline", "AuthService"]
+_FRAMEWORKS = ["Spring Boot", "FastAPI", "Express.js", "Django", "Go Fiber"]
+_DATABASES = ["PostgreSQL", "MongoDB", "MySQL", "DynamoDB"]
+_QUEUES = ["RabbitMQ", "Apache Kafka", "AWS SQS", "Redis Streams"]
+_COMPUTE = ["EKS", "ECS", "Lambda", "EC2 Auto Scaling"]
+_POLICIES = ["Remote Work", "Leave", "Benefits", "Performance Review", "Travel Expense"]
+_EMPLOYEE_TYPES = ["full-time", "exempt", "salaried"]
+_AGREEMENT_TYPES = ["Master Service", "Software License", "Data Processing", "Non-Disclosure"]
+_COMPANIES = ["Acme Corporation", "TechVentures Inc.", "Global Solutions Ltd.", "Innovation Partners"]
+_COUNTERPARTIES = [c for c in _COMPANIES if c != _COMPANIES[0]]
+_STATES = ["Delaware", "California", "New York", "Texas"]
+_INDUSTRIES = ["Technology", "Healthcare", "Financial Services", "Retail", "Manufacturing"]
+_TOPICS = ["digital adoption", "customer preferences", "market dynamics", "technology trends"]
+_BARRIERS = ["cost concerns", "lack of expertise", "regulatory uncertainty", "legacy systems"]
+_OTHER_BARRIERS = [b for b in _BARRIERS if b != _BARRIERS[0]]
+_STAT_METHODS = ["regression analysis", "ANOVA", "chi-square testing", "factor analysis"]
+
+
 # Random data generators
 def random_money(min_val: int, max_val: int) -> int:
-    return random.randint(min_val, max_val) * 1000
+    return _RNG.randint(min_val, max_val) * 1000
 
 def random_percent(min_val: int, max_val: int) -> float:
-    return round(random.uniform(min_val, max_val), 1)
-
-def fill_financial_template(template: str) -> str:
-    months = ["January", "February", "March", "April", "May", "June", 
-              "July", "August", "September", "October", "November", "December"]
-    segments = ["Enterprise", "SMB", "Consumer", "Government", "Healthcare"]
-    regions = ["North America", "EMEA", "APAC", "Latin America"]
-    
-    return template.format(
-        period=random.choice(months) + " 2024",
+    return round(_RNG.uniform(min_val, max_val), 1)
+
+def fill_financial_template(parsed: list) -> str:
+    return _render_parsed(parsed, dict(
+        period=_RNG.choice(_MONTHS) + " 2024",
         revenue=random_money(5000, 50000),
         growth=random_percent(3, 25),
         expenses=random_money(2000, 30000),
         margin=random_percent(8, 35),
         savings=random_percent(5, 20),
         cash=random_money(10000, 100000),
-        ar_days=random.randint(25, 60),
-        segment=random.choice(segments),
-        segment_pct=random.randint(20, 45),
-        region=random.choice(regions),
-        new_customers=random.randint(10, 50),
+        ar_days=_RNG.randint(25, 60),
+        segment=_RNG.choice(_SEGMENTS),
+        segment_pct=_RNG.randint(20, 45),
+        region=_RNG.choice(_REGIONS),
+        new_customers=_RNG.randint(10, 50),
         retention=random_percent(85, 98),
         projected=random_money(6000, 60000),
-    )
-
-def fill_technical_template(template: str) -> str:
-    systems = ["OrderManagement", "CustomerPortal", "Analytics", "DataPipeline", "AuthService"]
-    frameworks = ["Spring Boot", "FastAPI", "Express.js", "Django", "Go Fiber"]
-    databases = ["PostgreSQL", "MongoDB", "MySQL", "DynamoDB"]
-    queues = ["RabbitMQ", "Apache Kafka", "AWS SQS", "Redis Streams"]
-    compute = ["EKS", "ECS", "Lambda", "EC2 Auto Scaling"]
-    
-    return template.format(
-        system_name=random.choice(systems),
-        throughput=random.randint(5000, 100000),
-        framework=random.choice(frameworks),
-        compute=random.choice(compute),
-        database=random.choice(databases),
-        replicas=random.randint(2, 5),
-        queue=random.choice(queues),
-        rate_limit=random.randint(100, 1000),
-        users=random.randint(10000, 500000),
+    ))
+
+def fill_technical_template(parsed: list) -> str:
+    return _render_parsed(parsed, dict(
+        system_name=_RNG.choice(_SYSTEMS),
+        throughput=_RNG.randint(5000, 100000),
+        framework=_RNG.choice(_FRAMEWORKS),
+        compute=_RNG.choice(_COMPUTE),
+        database=_RNG.choice(_DATABASES),
+        replicas=_RNG.randint(2, 5),
+        queue=_RNG.choice(_QUEUES),
+        rate_limit=_RNG.randint(100, 1000),
+        users=_RNG.randint(10000, 500000),
         shard_key="customer_id",
-        shards=random.randint(4, 16),
-    )
-
-def fill_hr_template(template: str) -> str:
-    policies = ["Remote Work", "Leave", "Benefits", "Performance Review", "Travel Expense"]
-    employee_types = ["full-time", "exempt", "salaried"]
-    
-    return template.format(
-        policy_name=random.choice(policies),
+        shards=_RNG.randint(4, 16),
+    ))
+
+def fill_hr_template(parsed: list) -> str:
+    return _render_parsed(parsed, dict(
+        policy_name=_RNG.choice(_POLICIES),
         effective_date="January 1, 2024",
-        employee_type=random.choice(employee_types),
-        probation_period=random.choice([30, 60, 90]),
-        days=random.randint(15, 30),
-        match=random.choice([3, 4, 5, 6]),
-        dev_budget=random.randint(1000, 5000),
-        training_days=random.choice([30, 60, 90]),
+        employee_type=_RNG.choice(_EMPLOYEE_TYPES),
+        probation_period=_RNG.choice([30, 60, 90]),
+        days=_RNG.randint(15, 30),
+        match=_RNG.choice([3, 4, 5, 6]),
+        dev_budget=_RNG.randint(1000, 5000),
+        training_days=_RNG.choice([30, 60, 90]),
         compliance_date="December 31st",
-        ext=random.randint(1000, 9999),
-    )
-
-def fill_legal_template(template: str) -> str:
-    agreement_types = ["Master Service", "Software License", "Data Processing", "Non-Disclosure"]
-    companies = ["Acme Corporation", "TechVentures Inc.", "Global Solutions Ltd.", "Innovation Partners"]
-    states = ["Delaware", "California", "New York", "Texas"]
-    
-    return template.format(
-        agreement_type=random.choice(agreement_types),
+        ext=_RNG.randint(1000, 9999),
+    ))
+
+def fill_legal_template(parsed: list) -> str:
+    return _render_parsed(parsed, dict(
+        agreement_type=_RNG.choice(_AGREEMENT_TYPES),
         effective_date="January 15, 2024",
-        party_a=random.choice(companies),
-        party_b=random.choice([c for c in companies if c != companies[0]]),
-        term=random.choice([1, 2, 3, 5]),
-        notice=random.choice([30, 60, 90]),
+        party_a=_RNG.choice(_COMPANIES),
+        party_b=_RNG.choice(_COUNTERPARTIES),
+        term=_RNG.choice([1, 2, 3, 5]),
+        notice=_RNG.choice([30, 60, 90]),
         liability=random_money(100, 1000),
         fee_period=12,
-        state=random.choice(states),
-    )
-
-def fill_research_template(template: str) -> str:
-    industries = ["Technology", "Healthcare", "Financial Services", "Retail", "Manufacturing"]
-    topics = ["digital adoption", "customer preferences", "market dynamics", "technology trends"]
-    barriers = ["cost concerns", "lack of expertise", "regulatory uncertainty", "legacy systems"]
-    stat_methods = ["regression analysis", "ANOVA", "chi-square testing", "factor analysis"]
-    
-    return template.format(
-        topic=random.choice(topics),
-        industry=random.choice(industries),
-        sample_size=random.randint(500, 5000),
-        regions=random.randint(3, 12),
+        state=_RNG.choice(_STATES),
+    ))
+
+def fill_research_template(parsed: list) -> str:
+    return _render_parsed(parsed, dict(
+        topic=_RNG.choice(_TOPICS),
+        industry=_RNG.choice(_INDUSTRIES),
+        sample_size=_RNG.randint(500, 5000),
+        regions=_RNG.randint(3, 12),
         start_date="Q1 2024",
         end_date="Q3 2024",
-        finding_pct=random.randint(45, 85),
+        finding_pct=_RNG.randint(45, 85),
         preference="digital-first solutions",
-        market_size=random.randint(50, 500),
+        market_size=_RNG.randint(50, 500),
         cagr=random_percent(8, 25),
-        barrier1=random.choice(barriers),
-        barrier2=random.choice([b for b in barriers if b != barriers[0]]),
-        stat_method=random.choice(stat_methods),
-        confidence=random.choice([90, 95, 99]),
+        barrier1=_RNG.choice(_BARRIERS),
+        barrier2=_RNG.choice(_OTHER_BARRIERS),
+        stat_method=_RNG.choice(_STAT_METHODS),
+        confidence=_RNG.choice([90, 95, 99]),
         margin=random_percent(2, 5),
-        top_players=random.randint(3, 7),
-        market_share=random.randint(55, 80),
+        top_players=_RNG.randint(3, 7),
+        market_share=_RNG.randint(55, 80),
         differentiator1="pricing strategy",
         differentiator2="product innovation",
         differentiator3="customer service",
         rec1="core technology infrastructure",
         rec2="key industry players",
         rec3="go-to-market",
-    )
+    ))
 
 TEMPLATE_FILLERS = {
     "financial": fill_financial_template,
@@ -366,11 +406,11 @@ TEMPLATE_FILLERS = {
 
 def generate_filename(category: str, index: int) -> str:
     """Generate a unique filename from the category templates."""
-    templates = CATEGORIES[category]["filenames"]
+    templates = CATEGORIES[category]["_parsed_filenames"]
     template = templates[index % len(templates)]
-    
+
     # Fill in template variables with index-based values for uniqueness
-    base_name = template.format(
+    base_name = _render_parsed(template, dict(
         quarter=(index % 4) + 1,
         year=2023 + (index % 2),
         month=["Jan", "Feb", "Mar", "Apr", "May", "Jun", 
@@ -379,72 +419,109 @@ def generate_filename(category: str, index: int) -> str:
         date=f"2024{(index % 12) + 1:02d}",
         industry=["Tech", "Healthcare", "Finance", "Retail"][index % 4],
         tech=["AI", "Cloud", "Blockchain", "IoT"][index % 4],
-    )
+    ))
     # Add suffix for uniqueness within same template
     if index >= len(templates):
         suffix = f"_{index // len(templates) + 1}"
         base_name = base_name.replace(".pdf", f"{suffix}.pdf")
     return base_name
 
+# Inline markup used by the content templates; replaced with plain text
+# before drawing since the canvas API takes no HTML-ish tags
+_BREAK_RE = re.compile(r'<br\s*/?>')
+_TAG_RE = re.compile(r'</?b>')
+_WS_RE = re.compile(r'[ \t]+')
+
+
+def _markup_to_lines(content: str, width: int = 90) -> list[str]:
+    """Convert template markup to plain wrapped text lines."""
+    text = _BREAK_RE.sub('\n', content)
+    text = _TAG_RE.sub('', text)
+
+    lines = []
+    for raw_line in text.split('\n'):
+        line = _WS_RE.sub(' ', raw_line).strip()
+        if line:
+            lines.extend(textwrap.wrap(line, width))
+        else:
+            lines.append('')
+    return lines
+
+
 def create_pdf(filepath: Path, content: str, title: str) -> None:
     """Create a PDF with the given content."""
-    doc = SimpleDocTemplate(
-        str(filepath),
-        pagesize=letter,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=72,
-    )
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-    )
-    body_style = ParagraphStyle(
-        'CustomBody',
-        parent=styles['Normal'],
-        fontSize=11,
-        leading=16,
-    )
-    
-    story = []
-    story.append(Paragraph(title, title_style))
-    story.append(Spacer(1, 0.25 * inch))
-    story.append(Paragraph(content, body_style))
-    
-    doc.build(story)
+    # The documents here are simple single-page text, so draw straight
+    # onto a canvas - platypus's paragraph-breaking layout engine is
+    # 5-10x slower and buys nothing for this shape of content.
+    c = canvas.Canvas(str(filepath), pagesize=letter)
+
+    tx = c.beginText(72, 720)
+    tx.setFont("Helvetica-Bold", 18)
+    tx.textLine(title)
+    tx.textLine("")
+
+    tx.setFont("Helvetica", 11)
+    for line in _markup_to_lines(content):
+        tx.textLine(line)
+
+    c.drawText(tx)
+    c.save()
+
+@functools.lru_cache(maxsize=None)
+def _generate_content(category: str, index: int) -> str:
+    """
+    Fill the category's content template for a given index.
+
+    Each category has exactly one content template, so the fill is the
+    only source of variation. Seeding the RNG from (category, index)
+    makes every PDF reproducible across runs, which in turn makes the
+    result safe to memoize.
+    """
+    _RNG.seed(f"{category}:{index}")
+    parsed = CATEGORIES[category]["_parsed"][0]
+    return TEMPLATE_FILLERS[category](parsed)
+
+
+def _render_one(task: tuple[str, str, str]) -> str:
+    """Worker: render a single PDF from a (filepath, content, title) task."""
+    filepath_str, content, title = task
+    create_pdf(Path(filepath_str), content, title)
+    return filepath_str
+
 
 def main():
     # Create output directory
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    
+
     print(f"Generating 100 PDFs in {OUTPUT_DIR}...")
-    
+
+    # Precompute all filenames and content single-threaded so the random
+    # state stays reproducible, then fan the CPU-bound rendering out to
+    # all cores. Plain strings cross the pickle boundary, not Path objects.
+    tasks = []
+
     # Generate 20 PDFs per category (5 categories × 20 = 100)
-    pdf_count = 0
-    
     for category in CATEGORIES:
         for i in range(20):
             # Generate unique filename (now deterministic based on index)
             filename = generate_filename(category, i)
             filepath = OUTPUT_DIR / filename
-            
-            # Get content template and fill it
-            template = random.choice(CATEGORIES[category]["content_templates"])
-            filler = TEMPLATE_FILLERS[category]
-            content = filler(template)
-            
-            # Create the PDF
+
+            # Deterministic, memoized content fill
+            content = _generate_content(category, i)
+
             title = filename.replace("_", " ").replace(".pdf", "")
-            create_pdf(filepath, content, title)
-            
+            tasks.append((str(filepath), content, title))
+
+    # Render on all cores - each PDF is independent, no shared state.
+    # tqdm batches progress output instead of a write syscall per PDF,
+    # which would otherwise serialize the workers on stdout.
+    pdf_count = 0
+    with multiprocessing.Pool(os.cpu_count()) as pool:
+        results = pool.imap_unordered(_render_one, tasks, chunksize=4)
+        for _ in tqdm(results, total=len(tasks), desc="Generating PDFs"):
             pdf_count += 1
-            print(f"  [{pdf_count}/100] Created: {filename}")
-    
+
     print(f"\n✓ Successfully generated {pdf_count} PDFs in: {OUTPUT_DIR}")
 
 if __name__ == "__main__":
@@ -3,14 +3,19 @@ PDF Ingestion Pipeline
 Extracts text from PDFs, chunks it, embeds with sentence-transformers, and stores in ChromaDB.
 """
 
+import bisect
+import hashlib
 import os
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dataclasses import dataclass
 
-import pypdf
+import pypdfium2 as pdfium
 import chromadb
-from chromadb.utils import embedding_functions
+import torch
+from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
 # Configure logging
@@ -26,12 +31,40 @@ PDF_DIR = PROJECT_ROOT / "data" / "pdfs"
 CHROMA_DIR = PROJECT_ROOT / "data" / "chroma_db"
 FAILED_FILES_PATH = PROJECT_ROOT / "data" / "failed_files.txt"
 
+# Embedding config
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+ENCODE_BATCH_SIZE = 64
+GPU_ENCODE_BATCH_SIZE = 256  # Larger batches keep the GPU saturated
+STORE_BATCH_SIZE = 256  # Chunks buffered before each ChromaDB write
+
+
+def load_embedding_model() -> tuple[SentenceTransformer, int]:
+    """
+    Load the embedding model on the best available device.
+
+    On CUDA the model is cast to FP16, which roughly halves memory and
+    runs the matmuls on tensor cores. Falls back to FP32 on CPU.
+
+    Returns:
+        Tuple of (model, encode batch size)
+    """
+    if torch.cuda.is_available():
+        model = SentenceTransformer(EMBEDDING_MODEL, device="cuda")
+        model.half()
+        return model, GPU_ENCODE_BATCH_SIZE
+
+    return SentenceTransformer(EMBEDDING_MODEL, device="cpu"), ENCODE_BATCH_SIZE
+
 # Chunking config
 CHUNK_SIZE_TOKENS = 512
 CHUNK_OVERLAP_TOKENS = 50
 MIN_CHUNK_TOKENS = 50
 APPROX_CHARS_PER_TOKEN = 4  # Rough estimate for English text
 
+# Sentence-ending punctuation followed by whitespace; compiled once so
+# chunk_text doesn't pay regex compilation per document
+_SENT_END = re.compile(r'[.!?][\s\n]')
+
 
 @dataclass
 class Chunk:
@@ -42,23 +75,23 @@ class Chunk:
     chunk_index: int
 
 
-def extract_text_from_pdf(pdf_path: Path) -> tuple[str, list[tuple[int, str]]]:
+def extract_text_from_pdf(pdf_path: Path) -> str:
     """
-    Extract text from a PDF file.
-    
-    Returns:
-        Tuple of (full_text, list of (page_num, page_text) tuples)
+    Extract the full text of a PDF file as a single string.
+
+    Chunking doesn't use page boundaries (chunks carry page_numbers=[1]),
+    so no per-page structure is kept - one generator pass into join
+    avoids holding a second copy of the document text.
     """
-    reader = pypdf.PdfReader(str(pdf_path))
-    pages = []
-    full_text_parts = []
-    
-    for page_num, page in enumerate(reader.pages, start=1):
-        text = page.extract_text() or ""
-        pages.append((page_num, text))
-        full_text_parts.append(text)
-    
-    return "\n".join(full_text_parts), pages
+    # pypdfium2 wraps PDFium (C), which parses content streams several
+    # times faster than the pure-Python pypdf it replaces. Reading the
+    # whole file up-front (tens of KB here) costs one syscall; parsing
+    # then seeks entirely in memory instead of re-reading the file for
+    # the xref table and each page object.
+    pdf = pdfium.PdfDocument(pdf_path.read_bytes())
+    return "\n".join(
+        page.get_textpage().get_text_range() or "" for page in pdf
+    )
 
 
 def chunk_text(text: str, filename: str) -> list[Chunk]:
@@ -78,27 +111,27 @@ def chunk_text(text: str, filename: str) -> list[Chunk]:
     text = text.strip()
     if len(text) < min_chunk_chars:
         return []  # Too short, skip
-    
+
+    # Precompute all sentence boundaries in one pass so the loop below
+    # can find the boundary nearest a chunk edge with a bisect instead
+    # of re-scanning (and re-slicing) a window of text per chunk.
+    boundaries = [m.end() for m in _SENT_END.finditer(text)]
+
     start = 0
     chunk_index = 0
-    
+
     while start < len(text):
         end = start + chunk_size_chars
-        
+
         # If not at the end, try to break at a sentence boundary
         if end < len(text):
-            # Look for sentence endings near the chunk boundary
-            search_start = max(start + chunk_size_chars - 100, start)
-            search_end = min(start + chunk_size_chars + 100, len(text))
-            search_region = text[search_start:search_end]
-            
-            # Find last sentence boundary in search region
-            for sep in ['. ', '.\n', '? ', '!\n', '! ', '?\n']:
-                last_sep = search_region.rfind(sep)
-                if last_sep != -1:
-                    end = search_start + last_sep + len(sep)
-                    break
-        
+            # Last sentence boundary within 100 chars of the chunk edge.
+            # The bisect over precomputed offsets is allocation-free; no
+            # window of text is sliced or re-scanned per chunk.
+            i = bisect.bisect_right(boundaries, end + 100) - 1
+            if i >= 0 and boundaries[i] > end - 100 and boundaries[i] > start:
+                end = boundaries[i]
+
         chunk_text = text[start:end].strip()
         
         # Only keep chunks above minimum length
@@ -119,6 +152,88 @@ def chunk_text(text: str, filename: str) -> list[Chunk]:
     return chunks
 
 
+def _extract_and_chunk(pdf_path_str: str) -> tuple[str, list[Chunk], str | None]:
+    """
+    Worker: extract and chunk a single PDF.
+
+    Returns:
+        Tuple of (filename, chunks, error message or None)
+    """
+    pdf_path = Path(pdf_path_str)
+    try:
+        full_text = extract_text_from_pdf(pdf_path)
+
+        if not full_text.strip():
+            return pdf_path.name, [], "No text content"
+
+        chunks = chunk_text(full_text, pdf_path.name)
+
+        if not chunks:
+            return pdf_path.name, [], "Text too short"
+
+        return pdf_path.name, chunks, None
+    except Exception as e:
+        return pdf_path.name, [], str(e)
+
+
+def _flush(collection, model: SentenceTransformer, encode_batch_size: int,
+           buffer: list[Chunk], embed_cache: dict[bytes, list[float]]) -> None:
+    """
+    Embed a buffer of chunks and write them to ChromaDB in one add.
+
+    The generated PDFs share template boilerplate, so identical chunk
+    texts recur across documents. embed_cache maps a content hash to
+    its embedding and persists across flushes - each distinct text is
+    encoded exactly once, and repeats cost a dict lookup.
+    """
+    digests = [
+        hashlib.blake2b(chunk.text.encode(), digest_size=16).digest()
+        for chunk in buffer
+    ]
+
+    new_texts = []
+    new_digests = []
+    pending = set()
+    for chunk, digest in zip(buffer, digests):
+        if digest not in embed_cache and digest not in pending:
+            new_texts.append(chunk.text)
+            new_digests.append(digest)
+            pending.add(digest)
+
+    if new_texts:
+        new_embeddings = model.encode(
+            new_texts,
+            batch_size=encode_batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        for digest, embedding in zip(new_digests, new_embeddings):
+            embed_cache[digest] = embedding.tolist()
+
+    embeddings = [embed_cache[digest] for digest in digests]
+
+    # Build all three parallel lists in a single pass over the buffer
+    ids = []
+    documents = []
+    metadatas = []
+    for chunk in buffer:
+        ids.append(f"{chunk.filename}_{chunk.chunk_index}")
+        documents.append(chunk.text)
+        metadatas.append({
+            "filename": chunk.filename,
+            "chunk_index": chunk.chunk_index,
+            # chunk_text always sets page_numbers=[1], so skip the join
+            "page_numbers": "1",
+        })
+
+    collection.add(
+        ids=ids,
+        embeddings=embeddings,
+        documents=documents,
+        metadatas=metadatas,
+    )
+
+
 def ingest_pdfs():
     """Main ingestion pipeline."""
     
@@ -129,11 +244,12 @@ def ingest_pdfs():
     logger.info("Initializing ChromaDB...")
     client = chromadb.PersistentClient(path=str(CHROMA_DIR))
     
-    # Use sentence-transformers for embeddings
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
-    
+    # Load the embedding model once - we encode chunks ourselves so the
+    # sentence-transformers minibatching sees the full corpus instead of
+    # being fragmented into per-add calls by ChromaDB's embedding function
+    logger.info(f"Loading embedding model {EMBEDDING_MODEL}...")
+    model, encode_batch_size = load_embedding_model()
+
     # Clear existing collection for fresh ingestion
     try:
         existing_collection = client.get_collection(name="pdf_chunks")
@@ -143,11 +259,10 @@ def ingest_pdfs():
             client.delete_collection(name="pdf_chunks")
     except Exception:
         pass  # Collection doesn't exist yet
-    
-    # Create collection
+
+    # Create collection (vectors are supplied explicitly on add)
     collection = client.get_or_create_collection(
         name="pdf_chunks",
-        embedding_function=embedding_fn,
         metadata={"description": "PDF document chunks for semantic search"}
     )
     
@@ -161,59 +276,45 @@ def ingest_pdfs():
     
     # Track failures
     failed_files = []
-    all_chunks = []
-    
-    # Process each PDF
-    for pdf_path in tqdm(pdf_files, desc="Processing PDFs"):
-        try:
-            # Extract text
-            full_text, pages = extract_text_from_pdf(pdf_path)
-            
-            if not full_text.strip():
-                logger.warning(f"No text extracted from {pdf_path.name}")
-                failed_files.append((pdf_path.name, "No text content"))
-                continue
-            
-            # Chunk the text
-            chunks = chunk_text(full_text, pdf_path.name)
-            
-            if not chunks:
-                logger.warning(f"No valid chunks from {pdf_path.name}")
-                failed_files.append((pdf_path.name, "Text too short"))
+    total_chunks = 0
+
+    # Extract and chunk in parallel - PDFium releases the GIL while it
+    # parses, so threads get full CPU utilization without the fork and
+    # pickling overhead of worker processes.
+    # Chunks are streamed to ChromaDB in STORE_BATCH_SIZE batches as
+    # PDFs finish, so peak memory is O(batch) rather than O(corpus).
+    buffer: list[Chunk] = []
+    embed_cache: dict[bytes, list[float]] = {}
+    max_workers = min(os.cpu_count() or 1, 8)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            _extract_and_chunk,
+            [str(p) for p in pdf_files],
+        )
+        for name, chunks, error in tqdm(results, total=len(pdf_files), desc="Processing PDFs"):
+            if error is not None:
+                logger.warning(f"Failed to process {name}: {error}")
+                failed_files.append((name, error))
                 continue
-            
-            all_chunks.extend(chunks)
-            
-        except Exception as e:
-            logger.error(f"Failed to process {pdf_path.name}: {e}")
-            failed_files.append((pdf_path.name, str(e)))
-    
-    logger.info(f"Created {len(all_chunks)} chunks from {len(pdf_files) - len(failed_files)} PDFs")
-    
-    # Add chunks to ChromaDB in batches
-    if all_chunks:
-        logger.info("Adding chunks to ChromaDB...")
-        batch_size = 100
-        
-        for i in tqdm(range(0, len(all_chunks), batch_size), desc="Storing chunks"):
-            batch = all_chunks[i:i + batch_size]
-            
-            collection.add(
-                ids=[f"{chunk.filename}_{chunk.chunk_index}" for chunk in batch],
-                documents=[chunk.text for chunk in batch],
-                metadatas=[{
-                    "filename": chunk.filename,
-                    "chunk_index": chunk.chunk_index,
-                    "page_numbers": ",".join(map(str, chunk.page_numbers))
-                } for chunk in batch]
-            )
-    
+            buffer.extend(chunks)
+            total_chunks += len(chunks)
+            if len(buffer) >= STORE_BATCH_SIZE:
+                _flush(collection, model, encode_batch_size, buffer, embed_cache)
+                buffer.clear()
+
+    # Final flush for the remainder
+    if buffer:
+        _flush(collection, model, encode_batch_size, buffer, embed_cache)
+        buffer.clear()
+
+    logger.info(f"Created {total_chunks} chunks from {len(pdf_files) - len(failed_files)} PDFs")
+
+
     # Log failures
     if failed_files:
         logger.warning(f"{len(failed_files)} files failed to process")
         with open(FAILED_FILES_PATH, 'w') as f:
-            for filename, reason in failed_files:
-                f.write(f"{filename}: {reason}\n")
+            f.writelines(f"{filename}: {reason}\n" for filename, reason in failed_files)
         logger.info(f"Failed files logged to {FAILED_FILES_PATH}")
     
     # Summary
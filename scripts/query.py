@@ -3,8 +3,12 @@ Query Pipeline
 Handles user queries: search → rerank → generate answer with citations.
 """
 
+import hashlib
+import heapq
 import os
 import logging
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dataclasses import dataclass
 
@@ -13,10 +17,6 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv(Path(__file__).parent.parent / ".env")
 
-import chromadb
-from sentence_transformers import CrossEncoder
-from openai import OpenAI
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,15 +26,38 @@ logger = logging.getLogger(__name__)
 
 # Paths
 PROJECT_ROOT = Path(__file__).parent.parent
-CHROMA_DIR = PROJECT_ROOT / "data" / "chroma_db"
+MODELS_DIR = PROJECT_ROOT / "models"
+RERANKER_ONNX_PATH = MODELS_DIR / "reranker-int8.onnx"
+RERANKER_TOKENIZER_PATH = MODELS_DIR / "reranker-tokenizer"
+QUERY_EMB_CACHE_PATH = PROJECT_ROOT / ".cache" / "query_embeddings.pkl"
+# Bump whenever the embedding scheme changes (model, normalization, ...)
+# so stale cached vectors are discarded instead of served on cache hits
+QUERY_EMB_CACHE_VERSION = 2
 
 # Config
 TOP_K_SEARCH = 20  # Initial retrieval
 TOP_K_RERANK = 5   # After reranking
-DISTANCE_THRESHOLD = 1.0  # Max distance for "no results" detection
+# Max distance for candidate pruning and "no results" detection, on
+# Chroma's default squared-L2 scale over unit-norm vectors (range 0-4;
+# 1.0 ~ cosine similarity 0.5). Assumes normalized embeddings on both
+# the ingest and query side.
+DISTANCE_THRESHOLD = 1.0
+RERANKER_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+RERANK_MAX_LENGTH = 256  # Token budget per (query, chunk) pair
+RERANK_MAX_CHARS = 2000  # ~500 tokens; pre-truncation before tokenizing
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # Must match ingest.py
 
+# Static generation instructions, built once at import
+SYSTEM_PROMPT = """You are a helpful assistant that answers questions based on provided document excerpts.
 
-@dataclass
+Rules:
+1. Answer ONLY using information from the provided context
+2. Cite the source filename for every statement (e.g., "According to Report.pdf, ...")
+3. If the context doesn't contain enough information, say so
+4. Be concise and direct"""
+
+
+@dataclass(slots=True)
 class SearchResult:
     """A search result with metadata."""
     text: str
@@ -47,53 +70,292 @@ class SearchResult:
 class QueryPipeline:
     """Handles the full query pipeline: search → rerank → generate."""
     
-    def __init__(self, openai_api_key: str = None):
+    def __init__(self, openai_api_key: str = None, warmup: bool = True):
         """Initialize the query pipeline."""
-        # ChromaDB
+        # Pin CPU thread counts before torch (via sentence-transformers)
+        # initializes: containerized defaults are often wrong for this
+        # workload, and MKL/OpenMP read OMP_NUM_THREADS once at library
+        # load. One intra-op pool sized to the machine (overridable via
+        # TORCH_THREADS) does the heavy lifting; a single interop thread
+        # avoids pool-vs-pool contention with our own executor.
+        os.environ.setdefault("OMP_NUM_THREADS", str(os.cpu_count() or 1))
+        import torch
+        torch.set_num_threads(int(os.getenv("TORCH_THREADS", os.cpu_count() or 1)))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Only settable before torch's first parallel region; fine
+            # to keep the default if something beat us to it
+            pass
+
+        # Imported here rather than at module scope: chromadb (via
+        # _chroma), sentence-transformers (which pulls in torch), and
+        # openai cost seconds on cold start, and nothing outside the
+        # pipeline needs them - keeps `--help`, quick exits, and test
+        # imports fast.
+        from sentence_transformers import CrossEncoder, SentenceTransformer
+        from openai import OpenAI
+
+        from _chroma import get_collection
+
+        # ChromaDB (shared client, see _chroma.py)
         logger.info("Loading ChromaDB...")
-        self.client = chromadb.PersistentClient(path=str(CHROMA_DIR))
-        self.collection = self.client.get_collection("pdf_chunks")
+        self.collection = get_collection()
         
-        # Cross-encoder for reranking (local)
+        # Cross-encoder for reranking (local). Prefer the INT8 ONNX
+        # export (see export_reranker_onnx.py) - dynamic quantization is
+        # ~3-4x faster on CPU than the PyTorch model - and fall back to
+        # the stock CrossEncoder when the export isn't available.
         logger.info("Loading cross-encoder model...")
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        self.reranker = None
+        self.rerank_session = None
+        if RERANKER_ONNX_PATH.exists():
+            try:
+                import onnxruntime as ort
+                from transformers import AutoTokenizer
+
+                session_options = ort.SessionOptions()
+                session_options.intra_op_num_threads = os.cpu_count() or 1
+                self.rerank_session = ort.InferenceSession(
+                    str(RERANKER_ONNX_PATH),
+                    providers=["CPUExecutionProvider"],
+                    sess_options=session_options,
+                )
+                self.rerank_tokenizer = AutoTokenizer.from_pretrained(
+                    str(RERANKER_TOKENIZER_PATH)
+                    if RERANKER_TOKENIZER_PATH.exists()
+                    else RERANKER_MODEL
+                )
+                logger.info("Loaded INT8 ONNX reranker")
+            except Exception as e:
+                # Missing onnxruntime, a corrupt/stale export, a broken
+                # tokenizer dir - whatever went wrong, the CrossEncoder
+                # path below must take over rather than kill __init__
+                self.rerank_session = None
+                logger.warning(f"ONNX reranker unavailable ({e}) - using PyTorch reranker")
+
+        if self.rerank_session is None:
+            self.reranker = CrossEncoder(RERANKER_MODEL)
+            # Go straight at the underlying tokenizer/model in
+            # _score_batch - CrossEncoder.predict rebuilds a DataLoader
+            # and re-applies tokenization settings on every call, which
+            # a ~10-pair batch never amortizes
+            self.rerank_tokenizer = self.reranker.tokenizer
+            self.rerank_model = self.reranker.model.eval()
+
+        # Query embedding model + on-disk cache. Embedding the query
+        # ourselves (instead of query_texts) lets repeated queries -
+        # notably the golden-set evaluation reruns - skip the MiniLM
+        # forward pass entirely.
+        self.embedder = SentenceTransformer(EMBEDDING_MODEL)
+        self._query_emb_cache = self._load_query_emb_cache()
         
         # OpenAI client for generation
         api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         if api_key:
-            self.openai_client = OpenAI(api_key=api_key)
+            # Short timeouts plus the client's built-in exponential
+            # backoff: transient 5xx/rate-limit blips get retried
+            # instead of killing the query, and slow tails are cut well
+            # before the default 10-minute read timeout
+            import httpx
+
+            self.openai_client = OpenAI(
+                api_key=api_key,
+                timeout=httpx.Timeout(10.0, connect=2.0),
+                max_retries=3,
+            )
             logger.info("OpenAI client initialized")
         else:
             self.openai_client = None
             logger.warning("No OpenAI API key - generation disabled")
+
+        # Small pool used to overlap the CPU-bound rerank with the
+        # network-bound OpenAI connection warmup in query()
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        self._openai_warmed = False
+
+        if warmup:
+            # The persistent client lazily mmaps the HNSW index, so the
+            # first query pays the page-fault cost. A throwaway 1-NN
+            # query here pulls the index into RAM before the user's
+            # first real question.
+            try:
+                self.collection.query(
+                    query_embeddings=[self._embed_query("warmup")],
+                    n_results=1
+                )
+            except Exception as e:
+                logger.warning(f"Index warmup failed: {e}")
     
+    @staticmethod
+    def _load_query_emb_cache() -> dict:
+        """Load the query-embedding cache from disk (empty dict if absent)."""
+        try:
+            with open(QUERY_EMB_CACHE_PATH, 'rb') as f:
+                payload = pickle.load(f)
+            if payload.get("version") != QUERY_EMB_CACHE_VERSION:
+                # Vectors from an older embedding scheme (e.g. the
+                # pre-normalization cache) - keys are query hashes, so
+                # stale entries would be served forever on cache hits
+                return {}
+            return payload["embeddings"]
+        except Exception:
+            # Missing, truncated (EOFError), or otherwise unreadable -
+            # the cache is a pure optimization, so start fresh rather
+            # than let a bad file take down __init__
+            return {}
+
+    def _embed_query(self, query: str) -> list[float]:
+        """Embed a query, reusing the on-disk cache for repeat queries."""
+        key = hashlib.sha256(query.encode()).hexdigest()
+        embedding = self._query_emb_cache.get(key)
+
+        if embedding is None:
+            # normalize_embeddings must match _flush in ingest.py - the
+            # stored chunk vectors are unit-norm, and mixing scales
+            # inflates every distance past DISTANCE_THRESHOLD
+            embedding = self.embedder.encode(
+                query,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            ).tolist()
+            self._query_emb_cache[key] = embedding
+
+            # Write-through: queries are rare and the cache is small.
+            # Dump to a temp file and os.replace so an interrupted run
+            # or full disk never leaves a torn cache behind.
+            tmp_path = QUERY_EMB_CACHE_PATH.with_suffix('.pkl.tmp')
+            try:
+                QUERY_EMB_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(
+                        {
+                            "version": QUERY_EMB_CACHE_VERSION,
+                            "embeddings": self._query_emb_cache,
+                        },
+                        f,
+                    )
+                os.replace(tmp_path, QUERY_EMB_CACHE_PATH)
+            except OSError as e:
+                logger.warning(f"Could not persist query embedding cache: {e}")
+
+        return embedding
+
     def search(self, query: str, top_k: int = TOP_K_SEARCH) -> list[SearchResult]:
         """
         Stage 1: Vector search to get candidate chunks.
-        
+
         Args:
             query: User query
             top_k: Number of results to retrieve
-            
+
         Returns:
             List of SearchResult objects, sorted by distance (best first)
         """
         results = self.collection.query(
-            query_texts=[query],
+            query_embeddings=[self._embed_query(query)],
             n_results=top_k
         )
         
-        search_results = []
-        for i in range(len(results['documents'][0])):
-            search_results.append(SearchResult(
-                text=results['documents'][0][i],
-                filename=results['metadatas'][0][i]['filename'],
-                chunk_index=results['metadatas'][0][i]['chunk_index'],
-                distance=results['distances'][0][i],
-            ))
-        
-        return search_results
+        # One zip over the three parallel result lists instead of four
+        # subscripts per index
+        return [
+            SearchResult(
+                text=text,
+                filename=meta['filename'],
+                chunk_index=meta['chunk_index'],
+                distance=distance,
+            )
+            for text, meta, distance in zip(
+                results['documents'][0],
+                results['metadatas'][0],
+                results['distances'][0],
+            )
+        ]
     
+    @staticmethod
+    def _prune_candidates(results: list[SearchResult], keep_per_group: int = 2) -> list[SearchResult]:
+        """
+        Cheap O(n) filter between search and rerank.
+
+        Drops candidates past DISTANCE_THRESHOLD and keeps at most
+        keep_per_group chunks per (filename, neighborhood-of-3-chunks)
+        group - the top-20 list is usually padded with near-duplicate
+        chunks from the same section of the same PDF, and every pair
+        dropped here is a cross-encoder forward pass saved.
+        """
+        pruned = []
+        group_counts: dict[tuple[str, int], int] = {}
+        # results arrive sorted by distance, so the survivors of each
+        # group are its nearest chunks
+        for r in results:
+            if r.distance >= DISTANCE_THRESHOLD:
+                continue
+            group = (r.filename, r.chunk_index // 3)
+            count = group_counts.get(group, 0)
+            if count >= keep_per_group:
+                continue
+            group_counts[group] = count + 1
+            pruned.append(r)
+
+        # If the threshold filtered everything (off-topic query), fall
+        # back to the raw list so the existing no-results detection in
+        # _generation_fallback still sees the best candidate's scores
+        return pruned or results
+
+    def _score_pairs(self, query: str, texts: list[str]) -> list[float]:
+        """
+        Score (query, text) pairs with whichever reranker backend is loaded.
+
+        Texts are sorted by length and scored as short/long sub-batches
+        so each sub-batch only pads to its own longest sequence - chunk
+        lengths vary a lot, and padding everything to the global longest
+        wastes transformer FLOPs on PAD tokens.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        scores = [0.0] * len(texts)
+
+        mid = (len(order) + 1) // 2
+        for index_batch in (order[:mid], order[mid:]):
+            if not index_batch:
+                continue
+            batch_scores = self._score_batch(query, [texts[i] for i in index_batch])
+            for i, score in zip(index_batch, batch_scores):
+                scores[i] = score
+
+        return scores
+
+    def _score_batch(self, query: str, texts: list[str]) -> list[float]:
+        """Score one batch of (query, text) pairs, padded to its own longest."""
+        if self.rerank_session is not None:
+            # One tokenizer call over the whole batch, one session run
+            encoded = self.rerank_tokenizer(
+                [query] * len(texts),
+                texts,
+                padding=True,
+                truncation=True,
+                max_length=RERANK_MAX_LENGTH,
+                return_tensors="np",
+            )
+            logits = self.rerank_session.run(None, dict(encoded))[0]
+            return [float(s) for s in logits.reshape(-1)]
+
+        # PyTorch fallback: tokenize and forward directly instead of
+        # going through CrossEncoder.predict's per-call DataLoader setup
+        import torch
+
+        encoded = self.rerank_tokenizer(
+            [query] * len(texts),
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=RERANK_MAX_LENGTH,
+            return_tensors="pt",
+        )
+        with torch.inference_mode():
+            logits = self.rerank_model(**encoded).logits
+        return logits.squeeze(-1).tolist()
+
     def rerank(self, query: str, results: list[SearchResult], top_k: int = TOP_K_RERANK) -> list[SearchResult]:
         """
         Stage 2: Rerank results using cross-encoder.
@@ -110,57 +372,54 @@ class QueryPipeline:
         """
         if not results:
             return []
-        
-        # Create pairs for cross-encoder
-        pairs = [(query, r.text) for r in results]
-        
-        # Score all pairs
-        scores = self.reranker.predict(pairs)
-        
+
+        # Score all (query, chunk) pairs in one batch. Anything past the
+        # model's token budget would be silently discarded anyway, so
+        # cut overlong chunks at the character level first and spare the
+        # tokenizer (and padding) the wasted work.
+        scores = self._score_pairs(query, [r.text[:RERANK_MAX_CHARS] for r in results])
+
         # Add scores to results
         for i, result in enumerate(results):
             result.rerank_score = float(scores[i])
-        
-        # Sort by rerank score (higher is better) and return top K
-        results.sort(key=lambda r: r.rerank_score, reverse=True)
-        return results[:top_k]
+
+        # Top K by rerank score (higher is better) - O(n log k) and
+        # leaves the candidate list unmutated, unlike a full sort
+        return heapq.nlargest(top_k, results, key=lambda r: r.rerank_score)
     
-    def generate(self, query: str, results: list[SearchResult]) -> str:
-        """
-        Stage 3: Generate answer using LLM with context from top results.
-        
-        Args:
-            query: User query
-            results: Top reranked results
-            
-        Returns:
-            Generated answer with citations
-        """
+    def _warm_openai(self) -> None:
+        """Open the OpenAI HTTPS connection once, ahead of generation."""
+        if self._openai_warmed or not self.openai_client:
+            return
+        self._openai_warmed = True
+        try:
+            self.openai_client.models.retrieve("gpt-4o-mini")
+        except Exception as e:
+            logger.debug(f"OpenAI warmup failed: {e}")
+
+    def _generation_fallback(self, results: list[SearchResult]) -> str | None:
+        """Return a canned answer when generation can't or shouldn't run."""
         if not self.openai_client:
             return "[Error: OpenAI API key not configured]"
-        
+
         if not results:
             return "No relevant information found in the documents."
-        
+
         # Check if best result is too far (likely no good match)
         if results[0].distance > DISTANCE_THRESHOLD and results[0].rerank_score < 0:
             return "No relevant information found in the documents."
-        
+
+        return None
+
+    @staticmethod
+    def _build_messages(query: str, results: list[SearchResult]) -> list[dict]:
+        """Assemble the chat messages for the generation call."""
         # Build context from results
         context_parts = []
         for i, result in enumerate(results, 1):
             context_parts.append(f"[Source {i}: {result.filename}]\n{result.text}")
-        
-        context = "\n\n---\n\n".join(context_parts)
-        
-        # Generate with LLM
-        system_prompt = """You are a helpful assistant that answers questions based on provided document excerpts.
 
-Rules:
-1. Answer ONLY using information from the provided context
-2. Cite the source filename for every statement (e.g., "According to Report.pdf, ...")
-3. If the context doesn't contain enough information, say so
-4. Be concise and direct"""
+        context = "\n\n---\n\n".join(context_parts)
 
         user_prompt = f"""Context from documents:
 
@@ -172,13 +431,30 @@ Question: {query}
 
 Please answer the question using only the information provided above. Cite the filename for each statement."""
 
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def generate(self, query: str, results: list[SearchResult]) -> str:
+        """
+        Stage 3: Generate answer using LLM with context from top results.
+
+        Args:
+            query: User query
+            results: Top reranked results
+
+        Returns:
+            Generated answer with citations
+        """
+        fallback = self._generation_fallback(results)
+        if fallback is not None:
+            return fallback
+
         try:
             response = self.openai_client.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=self._build_messages(query, results),
                 temperature=0.3,
                 max_tokens=500
             )
@@ -186,15 +462,44 @@ Please answer the question using only the information provided above. Cite the f
         except Exception as e:
             logger.error(f"LLM generation failed: {e}")
             return f"[Error generating response: {e}]"
-    
-    def query(self, user_query: str, verbose: bool = False) -> dict:
+
+    def generate_stream(self, query: str, results: list[SearchResult]):
+        """
+        Streaming variant of generate: yields answer tokens as they arrive.
+
+        Time-to-first-token is sub-second, versus the multi-second wait
+        for the complete 500-token response in the blocking call.
+        """
+        fallback = self._generation_fallback(results)
+        if fallback is not None:
+            yield fallback
+            return
+
+        try:
+            response = self.openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=self._build_messages(query, results),
+                temperature=0.3,
+                max_tokens=500,
+                stream=True
+            )
+            for chunk in response:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except Exception as e:
+            logger.error(f"LLM generation failed: {e}")
+            yield f"[Error generating response: {e}]"
+
+    def query(self, user_query: str, verbose: bool = False, stream: bool = False) -> dict:
         """
         Run the full query pipeline.
-        
+
         Args:
             user_query: The user's question
             verbose: If True, include intermediate results
-            
+            stream: If True, 'answer' is a generator of tokens instead of a string
+
         Returns:
             Dict with 'answer' and optionally 'search_results' and 'reranked_results'
         """
@@ -202,15 +507,28 @@ Please answer the question using only the information provided above. Cite the f
         search_results = self.search(user_query)
         if verbose:
             logger.info(f"Search returned {len(search_results)} results")
-        
-        # Stage 2: Rerank
-        reranked_results = self.rerank(user_query, search_results)
+
+        # Stage 2: Rerank. Prune the candidate list first - the
+        # cross-encoder is the CPU bottleneck, so every duplicate or
+        # out-of-range chunk dropped here is a forward pass saved.
+        # Scoring is CPU-bound, so run it on the pool and use the wait
+        # to open the OpenAI HTTPS connection - the TLS handshake then
+        # doesn't sit on the critical path of the generation call.
+        candidates = self._prune_candidates(search_results)
+        if verbose:
+            logger.info(f"Pruned to {len(candidates)} rerank candidates")
+        rerank_future = self._executor.submit(self.rerank, user_query, candidates)
+        self._warm_openai()
+        reranked_results = rerank_future.result()
         if verbose:
             logger.info(f"Top result after rerank: {reranked_results[0].filename} (score: {reranked_results[0].rerank_score:.3f})")
-        
+
         # Stage 3: Generate
-        answer = self.generate(user_query, reranked_results)
-        
+        if stream:
+            answer = self.generate_stream(user_query, reranked_results)
+        else:
+            answer = self.generate(user_query, reranked_results)
+
         result = {"answer": answer}
         
         if verbose:
@@ -253,13 +571,16 @@ def main():
                 continue
             
             print("\nSearching...\n")
-            result = pipeline.query(query, verbose=True)
-            
+            result = pipeline.query(query, verbose=True, stream=True)
+
             print("-" * 40)
             print("ANSWER:")
             print("-" * 40)
-            print(result["answer"])
-            print()
+            # Print tokens as they arrive instead of waiting for the
+            # full response
+            for token in result["answer"]:
+                print(token, end='', flush=True)
+            print("\n")
             
             if "reranked_results" in result:
                 print("Sources used:")
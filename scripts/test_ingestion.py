@@ -3,20 +3,22 @@ Unit Tests for Ingestion Pipeline
 Tests extraction, chunking, embedding, and storage components.
 """
 
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Add project root to path
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
-import pypdf
-import chromadb
+import pandas as pd
+
+from _chroma import get_collection
 from ingest import extract_text_from_pdf, chunk_text, Chunk
 
 # Paths
 PDF_DIR = PROJECT_ROOT / "data" / "pdfs"
-CHROMA_DIR = PROJECT_ROOT / "data" / "chroma_db"
 
 
 def test_pdf_extraction():
@@ -26,11 +28,16 @@ def test_pdf_extraction():
     pdf_files = list(PDF_DIR.glob("*.pdf"))[:5]  # Test first 5
     passed = 0
     failed = 0
-    
-    for pdf_path in pdf_files:
+
+    # Extract in parallel - PDFium releases the GIL, so threads fan the
+    # work across cores just like the ingestion pipeline does
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(extract_text_from_pdf, p) for p in pdf_files]
+
+    for pdf_path, future in zip(pdf_files, futures):
         try:
-            full_text, pages = extract_text_from_pdf(pdf_path)
-            
+            full_text = future.result()
+
             if len(full_text) > 100:
                 print(f"  ✓ {pdf_path.name}: {len(full_text)} chars extracted")
                 passed += 1
@@ -51,7 +58,7 @@ def test_chunking():
     
     # Get a sample PDF
     pdf_path = list(PDF_DIR.glob("*.pdf"))[0]
-    full_text, _ = extract_text_from_pdf(pdf_path)
+    full_text = extract_text_from_pdf(pdf_path)
     
     chunks = chunk_text(full_text, pdf_path.name)
     
@@ -86,10 +93,8 @@ def test_chromadb_storage():
     """Test that ChromaDB has data with correct structure."""
     print("\n=== Test 3: ChromaDB Storage ===")
     
-    client = chromadb.PersistentClient(path=str(CHROMA_DIR))
-    
     try:
-        collection = client.get_collection("pdf_chunks")
+        collection = get_collection()
     except Exception as e:
         print(f"  ✗ Collection not found: {e}")
         return False
@@ -101,7 +106,9 @@ def test_chromadb_storage():
         print(f"  ✗ No chunks in database")
         return False
     
-    # Check sample data structure
+    # Check sample data structure. This test genuinely needs all three
+    # fields; embeddings are 384 floats apiece, so limit=1 keeps the
+    # transfer trivial.
     sample = collection.get(limit=1, include=["documents", "metadatas", "embeddings"])
     
     checks = [
@@ -129,32 +136,36 @@ def test_metadata_completeness():
     """Test that all chunks have complete metadata."""
     print("\n=== Test 4: Metadata Completeness ===")
     
-    client = chromadb.PersistentClient(path=str(CHROMA_DIR))
-    collection = client.get_collection("pdf_chunks")
+    collection = get_collection()
     
-    # Get all metadata
+    # Get all metadata - restrict include to exactly what this test
+    # reads; pulling default fields (documents) or embeddings would
+    # multiply the ChromaDB->Python transfer roughly tenfold
     all_data = collection.get(include=["metadatas"])
-    
-    missing_fields = []
+
     required_fields = ['filename', 'chunk_index', 'page_numbers']
-    
-    for i, meta in enumerate(all_data['metadatas']):
-        for field in required_fields:
-            if field not in meta or meta[field] is None:
-                missing_fields.append(f"Chunk {i} missing {field}")
-    
-    if missing_fields:
-        print(f"  ✗ {len(missing_fields)} missing fields:")
-        for msg in missing_fields[:5]:  # Show first 5
-            print(f"    - {msg}")
+
+    # One vectorized isna() sweep instead of N x F Python dict lookups;
+    # a field absent from every chunk shows up as a missing column
+    df = pd.DataFrame(all_data['metadatas'])
+    for field in required_fields:
+        if field not in df.columns:
+            df[field] = None
+    incomplete = df[required_fields].isna()
+    missing_mask = incomplete.any(axis=1)
+
+    if missing_mask.any():
+        print(f"  ✗ {int(missing_mask.sum())} chunks with missing fields:")
+        for i in df.index[missing_mask][:5]:  # Show first 5
+            missing = ", ".join(incomplete.columns[incomplete.loc[i]])
+            print(f"    - Chunk {i} missing {missing}")
         return False
-    
-    print(f"  ✓ All {len(all_data['metadatas'])} chunks have complete metadata")
-    
+
+    print(f"  ✓ All {len(df)} chunks have complete metadata")
+
     # Check filename distribution
-    filenames = set(m['filename'] for m in all_data['metadatas'])
-    print(f"  ✓ Chunks from {len(filenames)} unique PDFs")
-    
+    print(f"  ✓ Chunks from {df['filename'].nunique()} unique PDFs")
+
     return True
 
 
@@ -162,18 +173,35 @@ def test_no_duplicate_ids():
     """Test that there are no duplicate chunk IDs."""
     print("\n=== Test 5: No Duplicate IDs ===")
     
-    client = chromadb.PersistentClient(path=str(CHROMA_DIR))
-    collection = client.get_collection("pdf_chunks")
-    
-    all_ids = collection.get()['ids']
-    unique_ids = set(all_ids)
-    
-    if len(all_ids) != len(unique_ids):
-        duplicates = len(all_ids) - len(unique_ids)
+    collection = get_collection()
+
+    # Page through the IDs instead of materializing the whole collection
+    # in one get() - include=[] skips serializing documents/embeddings,
+    # and hash fingerprints keep the seen-set small at large chunk counts
+    seen = set()
+    duplicates = 0
+    total = 0
+    offset = 0
+    page_size = 10000
+
+    while True:
+        batch = collection.get(limit=page_size, offset=offset, include=[])['ids']
+        if not batch:
+            break
+        for chunk_id in batch:
+            fingerprint = hash(chunk_id)
+            if fingerprint in seen:
+                duplicates += 1
+            else:
+                seen.add(fingerprint)
+        total += len(batch)
+        offset += len(batch)
+
+    if duplicates:
         print(f"  ✗ Found {duplicates} duplicate IDs")
         return False
-    
-    print(f"  ✓ All {len(all_ids)} IDs are unique")
+
+    print(f"  ✓ All {total} IDs are unique")
     return True
 
 